@@ -0,0 +1,520 @@
+"""
+HTML圧縮ツールの圧縮ロジック（Streamlitに依存しない部分）。
+画面（html_compressor.py）とバッチ処理の両方から使う。
+"""
+import multiprocessing
+import os
+import re
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+# --- 正規表現パターン（モジュール読み込み時に一度だけコンパイル） ---
+_RE_WS = re.compile(r'\s+')
+_RE_MULTI_SPACES = re.compile(r' {2,}')
+_RE_HEAD_CONTENT = re.compile(r'<head>(.*?)</head>', re.DOTALL | re.IGNORECASE)
+_RE_TAG_GAP = re.compile(r'>\s+<')
+_RE_BODY = re.compile(r'<body.*?>.*?</body>', re.DOTALL | re.IGNORECASE)
+# Aggressive版で削除する空白：> と < の間 / = の前後
+_RE_AGGRESSIVE_DROP_WS = re.compile(r'\s(?:(?<=>\s)\s*(?=<)|\s*(?==)|(?<==\s)\s*)')
+# 完全圧縮で削除する空白：= < ; , の直後 / = > の直前 / > と < の間
+# （各分岐を \s で始めて、空白以外の文字を正規表現エンジンが高速に読み飛ばせるようにする）
+_RE_COMPLETE_DROP_WS = re.compile(r'\s(?:(?<=[=<;,]\s)\s*|\s*(?=[=>])|(?<=>\s)\s*(?=<))')
+_RE_STYLE_ATTR = re.compile(r'style="([^"]*)"')
+_RE_STYLE_COLON = re.compile(r'\s*:\s*')
+_RE_STYLE_SEMI = re.compile(r'\s*;\s*')
+_RE_NEWLINES = re.compile(r'\n+')
+_RE_TAG = re.compile(r'<([^>]+)>')
+_RE_TAG_NAME = re.compile(r'</?(\w+)')
+# アクティブコア分割用（バイト列）：現在位置から、クォート外で最初に現れる > までにマッチする
+_RE_UNQUOTED_GT = re.compile(rb'(?:[^>"\']++|"[^"]*+"?|\'[^\']*+\'?)*+>')
+_RE_UNQUOTED_GT_STR = re.compile(_RE_UNQUOTED_GT.pattern.decode('ascii'))  # ASCIIのみの行用（文字列のまま扱う）
+
+# --- 1文字単位の置換・削除テーブル（str.translate用） ---
+_DELETE_NEWLINES_TABS = str.maketrans('', '', '\n\r\t')
+# ASCIIの範囲で \s にマッチする文字（スペース以外）をすべてスペースに置換する
+_ASCII_WS_TO_SPACE = str.maketrans('\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f', ' ' * 9)
+
+
+# --- ヘルパー関数群（安全な改行挿入ロジック） ---
+
+def utf8_boundary(data: bytes, pos: int) -> int:
+    """
+    pos 以前で最も近いUTF-8の文字境界を返す。
+    継続バイト（0b10xxxxxx）の間は戻り、マルチバイト文字の途中で切らないようにする。
+    """
+    while pos < len(data) and data[pos] & 0xC0 == 0x80:
+        pos -= 1
+    return pos
+
+
+def split_line_safely(line: str, max_bytes: int) -> list:
+    """
+    1行が長い場合に、タグの区切り目（>）で安全に分割する。
+    クォート内の > は無視するロジックを実装。
+    分割候補（クォート外の > の直後）を先に列挙し、制限内で最も遠い候補を二分探索で選ぶ。
+    制限内の行はそのまま返す（ASCIIのみの行はエンコードせず、文字列のまま判定・分割する）。
+    """
+    is_ascii = line.isascii()
+    if is_ascii:
+        # ASCIIのみなら1文字＝1バイトなので、エンコードせず文字列のまま分割する
+        if len(line) <= max_bytes:
+            return [line]
+        data = line
+        unquoted_gt = _RE_UNQUOTED_GT_STR
+    else:
+        data = line.encode('utf-8')
+        if len(data) <= max_bytes:
+            return [line]
+        unquoted_gt = _RE_UNQUOTED_GT
+    data_len = len(data)
+
+    # 安全な分割ポイント（クォート外の > の直後）の位置を列挙する
+    # （クォートの読み飛ばしは正規表現エンジン側で行う）
+    safe_split_points = []
+    match = unquoted_gt.match(data)
+    while match:
+        split_point = match.end()
+        safe_split_points.append(split_point)
+        match = unquoted_gt.match(data, split_point)
+
+    result_lines = []
+    current_start = 0
+    while data_len - current_start > max_bytes:
+        limit = current_start + max_bytes
+        k = bisect_right(safe_split_points, limit) - 1
+        if k >= 0 and safe_split_points[k] > current_start:
+            # 制限内で最も遠い安全な分割ポイントで切る
+            split_pos = safe_split_points[k]
+        else:
+            # 安全な場所がない（巨大な1つのタグやテキスト）
+            # 仕方ないので強制的に切る（文字化け回避のため、マルチバイト文字の先頭まで戻る）
+            split_pos = limit if is_ascii else utf8_boundary(data, limit)
+        result_lines.append(data[current_start:split_pos])
+        current_start = split_pos
+    
+    # 残りの部分を追加
+    result_lines.append(data[current_start:])
+    if is_ascii:
+        return result_lines
+    return [chunk.decode('utf-8') for chunk in result_lines]
+
+
+def insert_line_breaks_for_activecore(html: str, max_bytes: int = 800) -> str:
+    """
+    アクティブコア対応（最終版）：
+    既存の改行構造を維持しつつ、800バイトを超える行だけを処理する。
+    """
+    # まず既存の行に分ける（Smart版などの整形を壊さないため）
+    original_lines = html.split('\n')
+    processed_lines = []
+    
+    # UTF-8は1文字最大4バイトなので、この文字数以下の行はバイト数を測るまでもなく制限内
+    always_fits_chars = max_bytes // 4
+    
+    for line in original_lines:
+        # 行末の空白除去（不具合防止）
+        line = line.rstrip()
+        if not line:
+            continue
+            
+        # バイト数チェック（短い行は計測を省略）
+        if len(line) <= always_fits_chars:
+            # 制限内ならそのまま（ここが重要！余計な詰め込みをしない）
+            processed_lines.append(line)
+        else:
+            # 制限オーバーの行だけ、安全に分割して追加
+            # （split_line_safely は制限内の行をそのまま返すので、エンコードは1行1回で済む）
+            splitted = split_line_safely(line, max_bytes)
+            processed_lines.extend(splitted)
+            
+    return '\n'.join(processed_lines)
+
+
+# --- 圧縮ロジック関数群 ---
+
+def _strip_comments(html: str) -> str:
+    """
+    コメント削除（条件付きコメントは残す）。
+    区切りが固定文字列なので、正規表現ではなく str.find で <!-- と --> を順に探して切り出す。
+    閉じられていない <!-- 以降はそのまま残す。
+    """
+    start = html.find('<!--')
+    if start == -1:
+        return html
+    parts = []
+    pos = 0
+    while start != -1:
+        if html.startswith('[if', start + 4):
+            # 条件付きコメントの開始 <!--[if ...]> は残す（中に含まれる通常のコメントは削除する）。
+            # ただし開始の直後に続くコメントは、Outlook以外に本文を見せるための書き方
+            # （<!--[if !mso]><!-->、<!-- -->、<!---->）の一部なので、これも残す
+            next_start = start + 4
+            opener_end = html.find(']>', next_start)
+            if opener_end != -1 and html.startswith('<!--', opener_end + 2):
+                revealed_end = _comment_end(html, opener_end + 2)
+                if revealed_end != -1:
+                    next_start = revealed_end
+            start = html.find('<!--', next_start)
+            continue
+        if html.startswith(('<![endif]', '>', '->'), start + 4):
+            # 非Outlook向けの終了 <!--<![endif]--> は残す。
+            # <!--> / <!---> はその場で閉じる空のコメント（後ろの --> まで探すと本文を巻き込む）なので残す
+            start = html.find('<!--', start + 5)
+            continue
+        end = html.find('-->', start + 4)
+        if end == -1:
+            break
+        parts.append(html[pos:start])
+        pos = end + 3
+        start = html.find('<!--', pos)
+    parts.append(html[pos:])
+    return ''.join(parts)
+
+def _comment_end(html: str, start: int) -> int:
+    """start の <!-- から始まるコメントの直後の位置を返す（閉じていなければ -1）"""
+    if html.startswith('>', start + 4):
+        return start + 5
+    if html.startswith('->', start + 4):
+        return start + 6
+    end = html.find('-->', start + 4)
+    return -1 if end == -1 else end + 3
+
+def _collapse_whitespace(html: str) -> str:
+    """連続する空白（改行・タブ等を含む）を1つのスペースにまとめる"""
+    if html.isascii():
+        # ASCIIのみなら空白をすべてスペースに揃え、スペースの連続だけをまとめればよい
+        return _RE_MULTI_SPACES.sub(' ', html.translate(_ASCII_WS_TO_SPACE))
+    return _RE_WS.sub(' ', html)
+
+def compress_header_only(html: str) -> str:
+    """ヘッダーのみ圧縮"""
+    head_match = _RE_HEAD_CONTENT.search(html)
+    if not head_match:
+        return html
+    head_content = head_match.group(1)
+    compressed_head = _RE_WS.sub(' ', head_content)
+    compressed_head = _RE_TAG_GAP.sub('><', compressed_head)
+    compressed_head = compressed_head.strip()
+    # 一致位置で切り貼りする（replace で全体をもう一度探索しない）
+    return ''.join((html[:head_match.start()], '<head>', compressed_head, '</head>', html[head_match.end():]))
+
+def compress_smart(html: str) -> str:
+    """Smart版圧縮 - 適度な圧縮"""
+    result = html
+    # コメント削除（条件付きコメントは残す）
+    result = _strip_comments(result)
+    # 複数の空白を1つに（タブは先にスペースへ置換）
+    result = result.replace('\t', ' ')
+    if '  ' in result:
+        result = _RE_MULTI_SPACES.sub(' ', result)
+    # タグ間の改行を削除（ただし、preタグ内は除く簡易実装）
+    # Smart版は可読性を残すため、あえて >\n< をすべて >< にはしない
+    # 行頭・行末の空白削除のみ行い、空になった行はその場で捨てる
+    return '\n'.join(filter(None, map(str.strip, result.split('\n'))))
+
+def compress_aggressive(html: str) -> str:
+    """Aggressive版 - 積極的な圧縮"""
+    result = html
+    result = _strip_comments(result)
+    if result.isascii():
+        result = result.translate(_DELETE_NEWLINES_TABS)
+    else:
+        # 非ASCII文字列の translate は1文字ずつの辞書引きになり replace より遅い
+        result = result.replace('\n', '').replace('\r', '').replace('\t', '')
+    # タグ間と属性値前後（破壊的変更に注意）の空白を1パスで削除してから、連続スペースをまとめる
+    result = _RE_AGGRESSIVE_DROP_WS.sub('', result)
+    if '  ' in result:
+        result = _RE_MULTI_SPACES.sub(' ', result)
+    return result.strip()
+
+def compress_complete(html: str) -> str:
+    """完全圧縮 - 最大限の圧縮"""
+    result = html
+    result = _strip_comments(result)
+    # 不要な空白を1パスで削除してから、残った空白を1つにまとめる
+    result = _RE_COMPLETE_DROP_WS.sub('', result)
+    return _collapse_whitespace(result).strip()
+
+def compress_preserve_indent(html: str) -> str:
+    """インデント保持版 - 階層構造を保ちつつ左側の余分なスペースを削除"""
+    # 各行の先頭の空白を1回だけ取り除き、（インデント幅, 内容）の組で持つ（空行はここで捨てる）
+    # 最小インデントレベル（全体を左寄せするための基準）も同じループで求める
+    entries = []
+    min_indent = None
+    for line in html.split('\n'):
+        content = line.lstrip()
+        if content:
+            indent = len(line) - len(content)
+            entries.append((indent, content))
+            if min_indent is None or indent < min_indent:
+                min_indent = indent
+    
+    # 最小インデントを引いた相対インデント（ただし2スペース単位に正規化）＋ 内容
+    return '\n'.join(
+        ' ' * (((indent - min_indent) // 2) * 2) + content
+        for indent, content in entries
+    )
+
+def _compress_head(head: str) -> str:
+    """
+    head部分の完全圧縮（ハイブリッド版・選択的圧縮版で共通）。
+    > と < の間・= の前後の空白を1パスで削除してから、残った空白を1つにまとめる。
+    """
+    result = _strip_comments(head)
+    result = _RE_AGGRESSIVE_DROP_WS.sub('', result)
+    return _collapse_whitespace(result).strip()
+
+def _split_head_body(html: str):
+    """
+    HTMLを（head前, head, headとbodyの間, body, body後）の5つに分ける。
+    head も body もなければ None を返す。各パーツは一致位置（span）から切り出す。
+    """
+    head_match = _RE_HEAD_CONTENT.search(html)
+    body_match = _RE_BODY.search(html)
+    if not head_match and not body_match:
+        return None
+    head_start, head_end = head_match.span() if head_match else (0, 0)
+    body_start, body_end = body_match.span() if body_match else (0, 0)
+    return (
+        html[:head_start] if head_match else "",
+        html[head_start:head_end],
+        html[head_end:body_start] if (head_match and body_match) else "",
+        html[body_start:body_end],
+        html[body_end:] if body_match else "",
+    )
+
+def compress_hybrid(html: str) -> str:
+    """ハイブリッド版 - ヘッダーは完全圧縮、ボディはインデント保持"""
+    # <head>と<body>を分離
+    parts = _split_head_body(html)
+    if parts is None:
+        # head/bodyがない場合は全体をインデント保持で処理
+        return compress_preserve_indent(html)
+    before_head, head_content, between, body_content, after_body = parts
+    
+    # ヘッダーは完全圧縮（ゴリゴリ削る）
+    if head_content:
+        head_content = _compress_head(head_content)
+    
+    # ボディはインデント保持
+    if body_content:
+        body_content = compress_preserve_indent(body_content)
+    
+    # 結合
+    result_parts = []
+    if before_head.strip():
+        result_parts.append(before_head.strip())
+    if head_content:
+        result_parts.append(head_content)
+    if between.strip():
+        result_parts.append(between.strip())
+    if body_content:
+        result_parts.append(body_content)
+    if after_body.strip():
+        result_parts.append(after_body.strip())
+    
+    return '\n'.join(result_parts)
+
+def compress_selective(html: str) -> str:
+    """選択的圧縮版 - テーブルタグは左寄せ、その他は構造保持"""
+    # <head>と<body>を分離
+    parts = _split_head_body(html)
+    if parts is None:
+        return compress_selective_indent(html)
+    before_head, head_content, between, body_content, after_body = parts
+    
+    # headは完全圧縮
+    if head_content:
+        head_content = _compress_head(head_content)
+    
+    # bodyは選択的インデント保持
+    if body_content:
+        body_content = compress_selective_indent(body_content)
+    
+    result_parts = []
+    if before_head.strip():
+        result_parts.append(before_head.strip())
+    if head_content:
+        result_parts.append(head_content)
+    if between.strip():
+        result_parts.append(between.strip())
+    if body_content:
+        result_parts.append(body_content)
+    if after_body.strip():
+        result_parts.append(after_body.strip())
+    
+    return '\n'.join(result_parts)
+
+def _compress_style(match):
+    """style属性の圧縮"""
+    style_content = match.group(1)
+    style_content = _RE_STYLE_COLON.sub(':', style_content)
+    style_content = _RE_STYLE_SEMI.sub(';', style_content)
+    style_content = _RE_NEWLINES.sub(' ', style_content)
+    style_content = _RE_WS.sub(' ', style_content)
+    style_content = style_content.strip()
+    return f'style="{style_content}"'
+
+def _compress_tag_spaces(match):
+    """タグ内のスペース圧縮"""
+    tag_content = match.group(1)
+    tag_content = _RE_WS.sub(' ', tag_content)
+    return '<' + tag_content.strip() + '>'
+
+MAX_INDENT = 8  # 選択的インデント保持の最大インデント（8スペース＝2階層）
+# インデント文字列は幅ごとに1つだけ作って使い回す
+_INDENT_STRINGS = tuple(' ' * width for width in range(MAX_INDENT + 1))
+# インデントを増やさないテーブル系タグ（集合で持ち、判定を O(1) にする）
+NO_INDENT_INCREASE_TAGS = frozenset({
+    'table', 'tbody', 'thead', 'tfoot', 'tr', 'td', 'th',
+    'colgroup', 'col'
+})
+
+def compress_selective_indent(html: str) -> str:
+    """選択的インデント保持 - テーブル系タグは親のインデントを継承（最大2階層）"""
+    lines = html.split('\n')
+    result_lines = []
+    current_indent = 0
+    
+    for line in lines:
+        content = line.strip()
+        if not content:
+            continue
+        
+        # style属性の圧縮
+        content = _RE_STYLE_ATTR.sub(_compress_style, content)
+        
+        # タグ内のスペース圧縮
+        content = _RE_TAG.sub(_compress_tag_spaces, content)
+        
+        # この行のタグを判定
+        tag_match = _RE_TAG_NAME.match(content)
+        
+        if tag_match:
+            keeps_indent = tag_match.group(1).lower() in NO_INDENT_INCREASE_TAGS
+            is_closing = content.startswith('</')
+            
+            # 閉じタグの場合、インデントを減らす（テーブルタグ以外）
+            if is_closing and not keeps_indent:
+                current_indent = max(0, current_indent - 4)
+            
+            # 現在のインデント（最大値で制限）
+            actual_indent = min(current_indent, MAX_INDENT)
+            result_lines.append(_INDENT_STRINGS[actual_indent] + content)
+            
+            # 開きタグの場合、次の行のためにインデントを増やす（テーブルタグ以外）
+            if not is_closing and not content.endswith('/>') and not keeps_indent:
+                current_indent = min(current_indent + 4, MAX_INDENT)
+        else:
+            actual_indent = min(current_indent, MAX_INDENT)
+            result_lines.append(_INDENT_STRINGS[actual_indent] + content)
+    
+    return '\n'.join(result_lines)
+
+def calculate_compression_ratio(original_size: int, compressed_size: int) -> tuple:
+    reduction = original_size - compressed_size
+    ratio = (reduction / original_size * 100) if original_size > 0 else 0
+    return original_size, compressed_size, reduction, ratio
+
+def check_line_byte_limits(html_bytes: bytes, max_bytes: int = 800) -> tuple:
+    """
+    制限を超える行と総行数を返す。
+    改行位置から全行のバイト数をNumPyでまとめて求め、文字列に戻すのは違反行だけにする。
+    """
+    data = np.frombuffer(html_bytes, dtype=np.uint8)
+    newlines = np.flatnonzero(data == 0x0A)
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [len(data)]))
+    line_bytes = ends - starts
+    violations = []
+    for i in np.flatnonzero(line_bytes > max_bytes).tolist():
+        start, end = int(starts[i]), int(ends[i])
+        line = html_bytes[start:end]
+        # 表示用に先頭100文字ぶんだけ文字列に戻す（101文字×最大4バイト＝404バイト）
+        head = line[:utf8_boundary(line, 404)].decode('utf-8')
+        violations.append((i + 1, end - start, head[:100] + '...' if len(head) > 100 else head))
+    return violations, len(starts)
+
+
+# 圧縮レベル（サイドバーの選択肢）ごとの圧縮関数
+COMPRESSORS = {
+    "1️⃣ ヘッダーのみ圧縮": compress_header_only,
+    "2️⃣ Smart版": compress_smart,
+    "3️⃣ Aggressive版": compress_aggressive,
+    "4️⃣ 完全圧縮": compress_complete,
+    "5️⃣ インデント保持版": compress_preserve_indent,
+    "6️⃣ ハイブリッド版": compress_hybrid,
+    "7️⃣ 選択的圧縮版（推奨★★）": compress_selective,
+}
+
+
+def apply_activecore_limit(compressed: str, activecore_mode: bool, max_bytes: int) -> str:
+    """圧縮後のHTMLに、必要ならアクティブコア制限を適用する（既存の改行は極力維持）。"""
+    if activecore_mode:
+        return insert_line_breaks_for_activecore(compressed, max_bytes)
+    return compressed
+
+
+def compress_document(html: str, compression_level: str, activecore_mode: bool, max_bytes: int) -> str:
+    """
+    選択された圧縮レベルで圧縮し、必要ならアクティブコア制限を適用する。
+    """
+    return apply_activecore_limit(COMPRESSORS[compression_level](html), activecore_mode, max_bytes)
+
+
+def _compress_file(html_bytes: bytes, compression_level: str, activecore_mode: bool, max_bytes: int) -> bytes:
+    """一括処理の1ファイル分（ワーカープロセスで実行するため、デコード・エンコードもここで行う）"""
+    compressed = compress_document(html_bytes.decode('utf-8'), compression_level, activecore_mode, max_bytes)
+    return compressed.encode('utf-8')
+
+
+def unique_file_names(names: list) -> list:
+    """
+    一括処理の結果をZIPにまとめるときのファイル名を、重複しないように付け直す。
+    同じ名前が2回目以降に出てきたら、拡張子の前に _2, _3, ... を付ける。
+    付け直した名前がアップロードされた別のファイルの名前と重ならないよう、
+    元の名前はすべて最初から使用済みとして扱う（元の名前のファイルはそのまま残る）。
+    """
+    used = set(names)
+    seen = set()
+    result = []
+    for name in names:
+        if name not in seen:
+            seen.add(name)
+            result.append(name)
+            continue
+        stem, ext = os.path.splitext(name)
+        n = 2
+        unique = f'{stem}_{n}{ext}'
+        while unique in used:
+            n += 1
+            unique = f'{stem}_{n}{ext}'
+        used.add(unique)
+        result.append(unique)
+    return result
+
+
+# 一括処理をワーカープロセスに振り分ける合計サイズの下限。
+# ワーカーの起動（Pythonの起動とモジュールの読み込み）に1プロセスあたり0.5秒ほどかかり、
+# 最も遅い完全圧縮＋アクティブコアでも約17MB/秒で処理できるので、これ未満は同じプロセスで圧縮した方が速い
+PARALLEL_MIN_TOTAL_BYTES = 32 * 1024 * 1024
+
+
+def compress_files(files: list, compression_level: str, activecore_mode: bool, max_bytes: int) -> list:
+    """
+    複数のHTML（UTF-8のバイト列）を圧縮し、圧縮後のバイト列を同じ順で返す。
+    通常は同じプロセスで順に圧縮し、合計サイズが大きいときだけファイルごとに別プロセスへ振り分ける。
+    """
+    workers = min(len(files), os.cpu_count() or 1)
+    if workers <= 1 or sum(map(len, files)) < PARALLEL_MIN_TOTAL_BYTES:
+        return [_compress_file(data, compression_level, activecore_mode, max_bytes) for data in files]
+    # Streamlit のサーバーはスレッドを使っているため、fork ではなく spawn でワーカーを起動する
+    # （ワーカーが画面のスクリプトを読み込んでも、画面は組み立てないようにしてある）
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return list(executor.map(
+            _compress_file, files,
+            repeat(compression_level), repeat(activecore_mode), repeat(max_bytes)
+        ))
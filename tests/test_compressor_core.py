@@ -0,0 +1,126 @@
+import random
+
+import pytest
+
+from compressor_core import (
+    _strip_comments,
+    compress_aggressive,
+    compress_complete,
+    compress_smart,
+    split_line_safely,
+    unique_file_names,
+)
+
+# メルマガでよく使う「Outlook以外にだけ表示する」条件付きコメント（開始の書き方は3通りある）
+NON_MSO_OPENERS = ['<!--[if !mso]><!-->', '<!--[if !mso]><!-- -->', '<!--[if !mso]><!---->']
+
+
+def non_mso_html(opener):
+    return (
+        f'{opener}\n'
+        '<div class="x">Hello</div>\n'
+        '<!--<![endif]-->\n'
+        '<p>World</p>\n'
+        '</body>'
+    )
+
+
+@pytest.mark.parametrize('opener', NON_MSO_OPENERS)
+@pytest.mark.parametrize('compress', [compress_smart, compress_aggressive, compress_complete])
+def test_non_mso_conditional_comment_is_kept(compress, opener):
+    result = compress(non_mso_html(opener))
+    assert opener in result
+    assert '<div class="x">Hello</div>' in result
+    assert '<!--<![endif]-->' in result
+    assert result.index(opener) < result.index('Hello') < result.index('<!--<![endif]-->')
+
+
+def test_strip_comments_removes_plain_comments_only():
+    html = 'a<!-- x -->b<!--[if mso]><p><!-- y --></p><![endif]-->c<!-->d<!--->e'
+    assert _strip_comments(html) == 'ab<!--[if mso]><p></p><![endif]-->c<!-->d<!--->e'
+
+
+def test_strip_comments_keeps_unterminated_comment():
+    assert _strip_comments('a<!-- b') == 'a<!-- b'
+
+
+def test_unique_file_names_adds_suffix_on_collision():
+    names = ['index.html', 'index.html', 'index_2.html', 'a.htm', 'index.html']
+    # アップロードされた index_2.html は名前を変えず、重複分の方が空いている番号を使う
+    assert unique_file_names(names) == ['index.html', 'index_3.html', 'index_2.html', 'a.htm', 'index_4.html']
+
+
+def test_unique_file_names_keeps_names_without_collision():
+    names = ['a.html', 'b.html', 'a_2.html']
+    assert unique_file_names(names) == names
+
+
+def split_ends(chunks):
+    """分割結果の各行が、元の行（UTF-8）の何バイト目で終わるか"""
+    ends = []
+    total = 0
+    for chunk in chunks:
+        total += len(chunk.encode('utf-8'))
+        ends.append(total)
+    return ends
+
+
+def test_split_ignores_gt_inside_quotes():
+    line = '<i>' + '<a t=">>>>">' + 'x' * 20
+    chunks = split_line_safely(line, 12)
+    assert chunks[0] == '<i>'
+    assert ''.join(chunks) == line
+
+
+def test_split_unclosed_quote_suppresses_later_split_points():
+    line = '<i>' + '<a t="' + 'x>' * 20
+    chunks = split_line_safely(line, 10)
+    assert chunks[0] == '<i>'
+    # 閉じていないクォート以降に安全な分割ポイントはないので、制限いっぱいで強制的に切る
+    assert [len(chunk) for chunk in chunks[1:-1]] == [10] * (len(chunks) - 2)
+    assert ''.join(chunks) == line
+
+
+def test_split_forced_cut_backs_up_to_utf8_lead_byte():
+    assert split_line_safely('あ' * 10, 8) == ['ああ'] * 5
+
+
+def test_split_when_overflowing_char_is_gt():
+    line = 'x' * 10 + '>' + 'y' * 5
+    assert split_line_safely(line, 10) == ['x' * 10, '>yyyyy']
+
+
+def test_split_ascii_and_non_ascii_lines_split_at_same_positions():
+    line = '<td class="a>b">ab</td>' * 10
+    ascii_ends = split_ends(split_line_safely(line, 50))
+    # 末尾にだけ非ASCII文字を足すと、バイト列での処理になるが、それより前の分割位置は変わらない
+    non_ascii_ends = split_ends(split_line_safely(line + 'é', 50))
+    assert non_ascii_ends[:len(ascii_ends) - 1] == ascii_ends[:-1]
+
+
+@pytest.mark.parametrize('max_bytes', [5, 13, 40, 100])
+def test_split_lines_never_exceed_max_bytes(max_bytes):
+    rng = random.Random(max_bytes)
+    alphabet = ['<a>', '<b c="d>e">', '"', "'", '>', 'x', ' ', 'あ', 'é', '😀']
+    for _ in range(200):
+        line = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 80)))
+        chunks = split_line_safely(line, max_bytes)
+        assert ''.join(chunks) == line
+        assert all(len(chunk.encode('utf-8')) <= max_bytes for chunk in chunks)
+
+
+# 1パスにまとめた空白削除が、元の逐次置換と同じ結果になることの確認（期待値は元の実装の出力）
+@pytest.mark.parametrize('html, aggressive, complete', [
+    ('a = b', 'a=b', 'a=b'),
+    ('<p> \n <b>', '<p><b>', '<p><b>'),
+    ('< div>', '< div>', '<div>'),
+    ('a ;  b', 'a ; b', 'a ;b'),
+    ('<a href = "x" >  <b> ,  c</b>', '<a href="x" ><b> , c</b>', '<a href="x"><b> ,c</b>'),
+    # 非ASCII（全角スペース・NBSP）：translate を使わない側の分岐
+    ('<p>　a\xa0 =　b\xa0</p>', '<p>　a=b\xa0</p>', '<p> a=b </p>'),
+    # ASCIIの制御文字の空白（\x0b, \x1c）：translate を使う側の分岐
+    ('<p>\x0ba\x1c= b\x1c</p>', '<p>\x0ba=b\x1c</p>', '<p> a=b </p>'),
+])
+def test_fused_whitespace_passes(html, aggressive, complete):
+    assert compress_aggressive(html) == aggressive
+    assert compress_complete(html) == complete